@@ -0,0 +1,67 @@
+"""Compare search_email_tool response size and serialization time with and without compaction.
+
+Uses synthetic messages shaped like ``get_email_message_details()`` output,
+with long quoted reply chains and signatures. Run with
+``python bench_compaction.py [messages]``.
+"""
+
+import json
+import sys
+import time
+
+from compaction import DEFAULT_FIELDS, compact_emails
+
+REPEATS = 50
+
+
+def synthetic_email(i):
+    reply = f"Hi,\r\n\r\nThanks for the update on item {i}.    Looks good to me, let's go ahead.\r\n\r\n"
+    signature = "-- \r\nJane Doe\r\nSenior Engineer | Example Corp\r\n+1 555 0100\r\n\r\n"
+    history = "".join(
+        f"On Mon, Jan {d}, 2024 at 10:00 AM Someone <someone@example.com> wrote:\r\n"
+        + "> Earlier message text that keeps getting quoted in every reply.\r\n" * 25
+        for d in range(1, 9)
+    )
+    return {
+        "id": f"18c{i:013x}",
+        "subject": f"Re: Project update {i}",
+        "sender": "Jane Doe <jane@example.com>",
+        "recipients": "team@example.com",
+        "body": reply + signature + history,
+        "snippet": f"Hi, Thanks for the update on item {i}. Looks good to me, let&#39;s go ahead.",
+        "has_attachments": False,
+        "date": "Tue, 2 Jan 2024 09:00:00 +0000",
+        "star": False,
+        "label": "IMPORTANT, CATEGORY_PERSONAL, INBOX",
+    }
+
+
+def measure(build):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        payload = json.dumps(build())
+    return len(payload.encode()), (time.perf_counter() - start) / REPEATS * 1e3
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    emails = [synthetic_email(i) for i in range(count)]
+
+    def full():
+        return {"success": True, "message": f"Found {len(emails)} emails", "emails": emails}
+
+    def compact():
+        compacted, truncated = compact_emails(emails, DEFAULT_FIELDS)
+        return {"success": True, "message": f"Found {len(compacted)} emails", "emails": compacted, "truncated": truncated}
+
+    full_bytes, full_ms = measure(full)
+    compact_bytes, compact_ms = measure(compact)
+
+    print(f"{count} messages, {REPEATS} repeats")
+    print(f"  full       {full_bytes:>9} bytes  {full_ms:7.3f} ms/response")
+    print(f"  compacted  {compact_bytes:>9} bytes  {compact_ms:7.3f} ms/response (including compaction)")
+    print(f"  reduction  {full_bytes / compact_bytes:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Measure the logging overhead a single tool call pays on the request path.
+
+Compares the previous synchronous ``basicConfig`` setup (file + stream handler
+formatting and writing in the caller) with the queue-based pipeline from
+``logging_config``. Run with ``python bench_logging.py [calls]``.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import logging_config
+
+ATTACHMENTS_PER_CALL = 5
+
+
+def simulated_tool_call(logger, msg_id):
+    logger.info("Downloading attachments for email %s", msg_id)
+    for i in range(ATTACHMENTS_PER_CALL):
+        logger.info("Saving attachment to: %s", f"downloaded_attachments/{msg_id}_{i}.pdf", extra={"sample": True})
+    logger.debug("Attachment download finished for %s", msg_id)
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def run(logger, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        simulated_tool_call(logger, f"msg{i:06d}")
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    logger = logging.getLogger("gmail_mcp")
+    devnull = open(os.devnull, "w")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stream = logging.StreamHandler(devnull)
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            handlers=[logging.FileHandler(os.path.join(tmp, "sync.log")), stream],
+        )
+        sync_us = run(logger, calls)
+        reset_root()
+
+        results = [("sync file+stream handlers", sync_us)]
+        for rate in (1.0, 0.1):
+            sys.stderr, saved = devnull, sys.stderr
+            try:
+                logging_config.setup_logging(log_file=os.path.join(tmp, f"queue_{rate}.log"), sample_rate=rate)
+            finally:
+                sys.stderr = saved
+            queue_us = run(logger, calls)
+            logging_config.shutdown_logging()
+            reset_root()
+            results.append((f"queue + json, sample_rate={rate}", queue_us))
+
+    devnull.close()
+    print(f"{calls} simulated tool calls, {ATTACHMENTS_PER_CALL + 1} records each")
+    for name, us in results:
+        print(f"  {name:<32} {us:8.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# compaction.py
+import json
+import re
+
+# Rough conversion used for budgets; close enough for English mail text
+CHARS_PER_TOKEN = 4
+
+EMAIL_FIELDS = (
+    "id",
+    "subject",
+    "sender",
+    "recipients",
+    "body",
+    "snippet",
+    "has_attachments",
+    "date",
+    "star",
+    "label",
+)
+DEFAULT_FIELDS = ("id", "subject", "sender", "date", "body", "has_attachments")
+
+# Patterns start at the newline before a line rather than with ^ so the regex
+# engine can skip straight between line breaks instead of trying every position
+
+# Outlook-style separators; everything after them is the previous message
+_HISTORY_HEADER = re.compile(
+    r"\n(?:-{2,}[ \t]*(?i:Original Message|Forwarded message)[ \t]*-{2,}"
+    r"|_{20,}[ \t]*(?=\n|$)"
+    r"|From: [^\n]*\n(?:[^\n]*\n)?(?:Sent|Date): )"
+)
+# "On ... wrote:" lines that introduce '>' quoted text
+_ATTRIBUTION = re.compile(r"\nOn [^\n]{0,200}(?:\n[^\n]{0,200})?wrote:[ \t]*(?=\n|$)")
+_QUOTED_LINE = re.compile(r"\n>[^\n]*")
+_UNQUOTED_LINE = re.compile(r"\n[ \t]*[^>\s]")
+# "-- " with the trailing space is the standard delimiter; a bare "--" is often just a divider
+_SIGNATURE = re.compile(r"\n(?:-- (?=\n|$)|Sent from my \w+|Get Outlook for \w+)")
+
+_INLINE_SPACE = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def strip_quoted(text):
+    # Pad so the first line also follows a newline; searching from 1 only cuts at
+    # a header that leaves some reply text above it
+    text = "\n" + text
+    match = _HISTORY_HEADER.search(text, 1)
+    if match:
+        text = text[: match.start()]
+
+    # Top-posted reply: nothing but quotes below the attribution, so cut there
+    match = _ATTRIBUTION.search(text, 1)
+    if match and not _UNQUOTED_LINE.search(_ATTRIBUTION.sub("", text[match.end() :])):
+        return text[1 : match.start()]
+
+    # Bottom-posted or inline reply: keep the answers, drop only the quotes
+    return _QUOTED_LINE.sub("", _ATTRIBUTION.sub("", text))[1:]
+
+
+def strip_signature(text):
+    match = _SIGNATURE.search(text)
+    return text[: match.start()] if match else text
+
+
+def collapse_whitespace(text):
+    text = _INLINE_SPACE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def truncate(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[: cut if cut > max_chars // 2 else max_chars].rstrip() + " [truncated]"
+
+
+def _fit(text, max_chars):
+    # Collapsing whitespace is the costly step, so only look at a window well past
+    # the budget; anything cut by the window still gets a marker
+    window = max_chars * 4
+    compact = truncate(collapse_whitespace(text[:window]), max_chars)
+    if len(text) > window and not compact.endswith(" [truncated]"):
+        compact += " [truncated]"
+    return compact
+
+
+def compact_body(body, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    body = body.replace("\r\n", "\n")
+    unquoted = strip_quoted(body)
+    unsigned = strip_signature(unquoted)
+    if not unsigned.strip():
+        # Fall back to the whole body if it was nothing but quoted text
+        return _fit(body, max_chars)
+
+    # Mark removals so the reader knows the message had more to it
+    compact = _fit(unsigned, max_chars)
+    if len(unsigned) < len(unquoted):
+        compact += "\n[signature removed]"
+    if len(unquoted) < len(body):
+        compact += "\n[quoted text removed]"
+    return compact
+
+
+def compact_email(details, fields=DEFAULT_FIELDS, max_body_tokens=500):
+    """Keep only ``fields`` of a message and shrink its body to ``max_body_tokens``."""
+    unknown = set(fields) - set(EMAIL_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown email fields: {', '.join(sorted(unknown))}")
+
+    compact = {field: details[field] for field in fields if field in details}
+    if "body" in compact:
+        compact["body"] = compact_body(compact["body"], max_body_tokens)
+    if "snippet" in compact:
+        compact["snippet"] = collapse_whitespace(compact["snippet"])
+    return compact
+
+
+def compact_emails(emails, fields=DEFAULT_FIELDS, max_body_tokens=500, max_response_tokens=8000):
+    """Compact messages until the response budget is spent.
+
+    ``emails`` may be a lazy iterable; nothing past the budget is consumed, so
+    callers can avoid fetching messages that would be dropped anyway.
+    Returns the compacted messages and whether the list was cut short.
+    """
+    compacted = []
+    used = 0
+    for details in emails:
+        compact = compact_email(details, fields, max_body_tokens)
+        cost = estimate_tokens(json.dumps(compact))
+        if compacted and used + cost > max_response_tokens:
+            return compacted, True
+        compacted.append(compact)
+        used += cost
+    return compacted, False
@@ -0,0 +1,364 @@
+# export_mailbox.py
+import argparse
+import base64
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from email import policy
+from email.parser import BytesHeaderParser
+
+from googleapiclient.errors import HttpError
+
+from gmail_api import init_gmail_service, search_email_pages
+from google_apis import get_transport_stats
+from logging_config import setup_logging
+
+logger = logging.getLogger("export_mailbox")
+
+EXPORT_FORMATS = ("mbox", "jsonl")
+COMPRESSIONS = ("gzip", "zstd", "none")
+
+# Gmail recommends keeping batch requests at or below 50 calls
+FETCH_BATCH_SIZE = 50
+RETRY_STATUSES = (429, 500, 502, 503)
+# Gmail reports most throttling as 403 with one of these reasons
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "RATE_LIMIT_EXCEEDED"}
+
+_FROM_LINE = re.compile(rb"^>*From ", re.MULTILINE)
+
+
+def _compress(data, compression):
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd compression requires the 'zstandard' package") from e
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def _mbox_entry(message):
+    raw = base64.urlsafe_b64decode(message["raw"]).replace(b"\r\n", b"\n")
+    # mboxrd quoting: any line matching ^>*From gains one more '>'
+    raw = _FROM_LINE.sub(rb">\g<0>", raw)
+    if not raw.endswith(b"\n"):
+        raw += b"\n"
+    stamp = time.asctime(time.gmtime(int(message.get("internalDate", 0)) / 1000))
+    return b"From MAILER-DAEMON " + stamp.encode() + b"\n" + raw + b"\n"
+
+
+def _jsonl_entry(message):
+    raw = base64.urlsafe_b64decode(message["raw"])
+    headers = []
+    for name, value in BytesHeaderParser(policy=policy.default).parsebytes(raw).raw_items():
+        # Malformed headers (common in spam) can raise almost anything while being
+        # decoded; keep the undecoded value rather than failing the whole chunk
+        try:
+            value = str(policy.default.header_fetch_parse(name, value))
+        except Exception:
+            pass
+        headers.append([name, value])
+    record = {
+        "id": message["id"],
+        "threadId": message.get("threadId"),
+        "labelIds": message.get("labelIds", []),
+        "internalDate": message.get("internalDate"),
+        "sizeEstimate": message.get("sizeEstimate"),
+        "headers": headers,
+        "raw": message["raw"],
+    }
+    return (json.dumps(record) + "\n").encode()
+
+
+def encode_chunk(messages, export_format, compression):
+    """Decode a batch of raw messages and compress it as one independent frame.
+
+    Concatenated gzip members and zstd frames are themselves valid streams, so
+    chunks can be encoded in worker processes and appended in order.
+    Returns the compressed bytes and the decoded size.
+    """
+    entry = _mbox_entry if export_format == "mbox" else _jsonl_entry
+    data = b"".join(entry(message) for message in messages)
+    return _compress(data, compression), len(data)
+
+
+def _is_retryable(e):
+    if not isinstance(e, HttpError):
+        return False
+    if e.resp.status in RETRY_STATUSES:
+        return True
+    if e.resp.status != 403:
+        return False
+    try:
+        error = json.loads(e.content)["error"]
+    except (ValueError, KeyError, TypeError):
+        return False
+    items = error.get("errors", []) + error.get("details", [])
+    return any(isinstance(item, dict) and item.get("reason") in RATE_LIMIT_REASONS for item in items)
+
+
+def fetch_raw_messages(service, msg_ids, user_id="me", retries=3):
+    """Fetch ``format=raw`` messages in one batch request, retrying throttled calls.
+
+    Returns the fetched messages in ``msg_ids`` order and the IDs that still
+    failed. Messages deleted since they were listed (404) are in neither.
+    """
+    results = {}
+    pending = list(msg_ids)
+    failed = []
+
+    for attempt in range(retries + 1):
+        errors = []
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            else:
+                errors.append((request_id, exception))
+
+        batch = service.new_batch_http_request(callback=callback)
+        for msg_id in pending:
+            batch.add(service.users().messages().get(userId=user_id, id=msg_id, format="raw"), request_id=msg_id)
+        batch.execute()
+
+        pending = [msg_id for msg_id, e in errors if _is_retryable(e)]
+        if attempt == retries:
+            failed.extend(errors)
+        else:
+            failed.extend((msg_id, e) for msg_id, e in errors if msg_id not in pending)
+        if not pending:
+            break
+        time.sleep(2**attempt)
+
+    skipped = []
+    for msg_id, e in failed:
+        if isinstance(e, HttpError) and e.resp.status == 404:
+            logger.info("Message %s was deleted before it could be exported", msg_id)
+        else:
+            logger.warning("Skipping message %s: %s", msg_id, e)
+            skipped.append(msg_id)
+
+    return [results[msg_id] for msg_id in msg_ids if msg_id in results], skipped
+
+
+def _load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _write_messages(service, pool, out, msg_ids, export_format, compression, user_id):
+    # Fetch the next batch while earlier ones are encoded in the pool
+    chunks = []
+    skipped = []
+    for i in range(0, len(msg_ids), FETCH_BATCH_SIZE):
+        raw_messages, batch_skipped = fetch_raw_messages(service, msg_ids[i : i + FETCH_BATCH_SIZE], user_id=user_id)
+        skipped.extend(batch_skipped)
+        chunks.append((len(raw_messages), pool.submit(encode_chunk, raw_messages, export_format, compression)))
+
+    exported = decoded = written = 0
+    for count, future in chunks:
+        data, decoded_size = future.result()
+        out.write(data)
+        exported += count
+        decoded += decoded_size
+        written += len(data)
+    out.flush()
+    os.fsync(out.fileno())
+    return exported, decoded, written, skipped
+
+
+def export_mailbox(
+    service,
+    output_path,
+    query="",
+    export_format="mbox",
+    compression="gzip",
+    resume=True,
+    overwrite=False,
+    max_messages=None,
+    workers=None,
+    user_id="me",
+):
+    """Stream every message matching ``query`` into a compressed mbox or JSONL file.
+
+    Progress is checkpointed to ``<output_path>.checkpoint`` after each page of
+    IDs, so a rerun with ``resume=True`` truncates any partially written page
+    and continues from the next one. Messages that could not be fetched are
+    kept in the checkpoint and retried on the next run; the export is only
+    ``done`` once none are left. An existing output file without a matching
+    checkpoint is never replaced unless ``overwrite=True``.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    checkpoint_path = f"{output_path}.checkpoint"
+    params = {"query": query, "format": export_format, "compression": compression}
+
+    state = _load_checkpoint(checkpoint_path) if resume else None
+    if state and {key: state.get(key) for key in params} != params:
+        raise ValueError(f"Checkpoint {checkpoint_path} belongs to a different export; remove it or use another path")
+    if state:
+        if not os.path.exists(output_path) or os.path.getsize(output_path) < state["bytes_written"]:
+            raise ValueError(f"{output_path} is shorter than its checkpoint; remove the checkpoint to start over")
+    else:
+        if os.path.exists(output_path) and not overwrite:
+            raise FileExistsError(f"{output_path} already exists; pass overwrite=True to replace it")
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        state = {
+            **params,
+            "page_token": None,
+            "exported": 0,
+            "bytes_written": 0,
+            "listed_all": False,
+            "skipped": [],
+            "done": False,
+        }
+
+    run_messages = 0
+    run_decoded = 0
+    run_written = 0
+    start = time.perf_counter()
+
+    def log_progress():
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "Exported %s messages: %.1f msg/s, %.2f MB/s decoded, %.2f MB/s written",
+            state["exported"],
+            run_messages / elapsed,
+            run_decoded / elapsed / 1e6,
+            run_written / elapsed / 1e6,
+            extra={"exported": state["exported"], "bytes_written": state["bytes_written"]},
+        )
+
+    if max_messages and state["exported"] >= max_messages:
+        state["listed_all"] = True
+
+    if not state["done"]:
+        logger.info("Exporting '%s' to %s, resuming after %s messages", query, output_path, state["exported"])
+        # The MCP server calls this from a worker thread, and forking a threaded
+        # process can deadlock, so start workers from a fork server instead
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+        with pool, open(output_path, "ab") as out:
+            out.truncate(state["bytes_written"])
+            # truncate() leaves the position alone, and tell() must match the file size
+            out.seek(state["bytes_written"])
+
+            pages = []
+            if not state["listed_all"]:
+                pages = search_email_pages(service, query, user_id=user_id, page_token=state["page_token"])
+            for messages, next_page_token in pages:
+                msg_ids = [msg["id"] for msg in messages]
+                limit_reached = False
+                if max_messages:
+                    remaining = max(max_messages - state["exported"], 0)
+                    limit_reached = len(msg_ids) >= remaining
+                    msg_ids = msg_ids[:remaining]
+
+                exported, decoded, written, skipped = _write_messages(
+                    service, pool, out, msg_ids, export_format, compression, user_id
+                )
+                run_messages += exported
+                run_decoded += decoded
+                run_written += written
+
+                state["exported"] += exported
+                state["bytes_written"] = out.tell()
+                state["skipped"].extend(skipped)
+                state["page_token"] = next_page_token
+                state["listed_all"] = limit_reached or not next_page_token
+                _save_checkpoint(checkpoint_path, state)
+                log_progress()
+
+                if state["listed_all"]:
+                    break
+
+            # Give messages skipped on this or earlier runs another chance
+            if state["listed_all"] and state["skipped"]:
+                exported, decoded, written, skipped = _write_messages(
+                    service, pool, out, state["skipped"], export_format, compression, user_id
+                )
+                run_messages += exported
+                run_decoded += decoded
+                run_written += written
+
+                state["exported"] += exported
+                state["bytes_written"] = out.tell()
+                state["skipped"] = skipped
+                _save_checkpoint(checkpoint_path, state)
+                log_progress()
+
+            state["done"] = state["listed_all"] and not state["skipped"]
+            _save_checkpoint(checkpoint_path, state)
+
+    if state["skipped"]:
+        logger.warning("%s messages could not be exported; rerun to retry them", len(state["skipped"]))
+
+    elapsed = time.perf_counter() - start
+    return {
+        "output_path": output_path,
+        "exported": state["exported"],
+        "bytes_written": state["bytes_written"],
+        "skipped": len(state["skipped"]),
+        "skipped_ids": state["skipped"],
+        "done": state["done"],
+        "elapsed_seconds": round(elapsed, 3),
+        "messages_per_second": round(run_messages / elapsed, 2) if elapsed else 0.0,
+        "decoded_bytes_per_second": round(run_decoded / elapsed) if elapsed else 0,
+        "written_bytes_per_second": round(run_written / elapsed) if elapsed else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a Gmail mailbox to a compressed mbox or JSONL file.")
+    parser.add_argument("email_identifier", help="Account whose token file in token_files/ should be used")
+    parser.add_argument("output_path")
+    parser.add_argument("--query", default="", help="Gmail search query, e.g. 'after:2024/01/01'")
+    parser.add_argument("--format", dest="export_format", choices=EXPORT_FORMATS, default="mbox")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="gzip")
+    parser.add_argument("--no-resume", dest="resume", action="store_false", help="Ignore an existing checkpoint")
+    parser.add_argument("--overwrite", action="store_true", help="Replace an existing output file")
+    parser.add_argument("--max-messages", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="Encoding processes (default: CPU count)")
+    parser.add_argument("--client-secret", default="client_secret.json", help="OAuth client secret JSON file")
+    args = parser.parse_args()
+
+    setup_logging()
+    with open(args.client_secret) as f:
+        client_config = f.read()
+    service = init_gmail_service(client_config, prefix=f"_{args.email_identifier}")
+
+    summary = export_mailbox(
+        service,
+        args.output_path,
+        query=args.query,
+        export_format=args.export_format,
+        compression=args.compression,
+        resume=args.resume,
+        overwrite=args.overwrite,
+        max_messages=args.max_messages,
+        workers=args.workers,
+    )
+    print(json.dumps({**summary, "transport": get_transport_stats()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import base64
+import logging
 import os
 from email import encoders
 from email.mime.base import MIMEBase
@@ -7,9 +8,18 @@ from email.mime.text import MIMEText
 
 from google_apis import create_service
 
+logger = logging.getLogger("gmail_api")
 
-def init_gmail_service(client_file, api_name="gmail", api_version="v1", scopes=["https://mail.google.com/"], prefix=""):
-    return create_service(client_file, api_name, api_version, scopes, prefix=prefix)
+
+def init_gmail_service(
+    client_file,
+    api_name="gmail",
+    api_version="v1",
+    scopes=["https://mail.google.com/"],
+    prefix="",
+    transport_config=None,
+):
+    return create_service(client_file, api_name, api_version, scopes, prefix=prefix, transport_config=transport_config)
 
 
 def _extract_body(payload):
@@ -85,7 +95,7 @@ def get_email_message_details(service, msg_id):
             "label": label,
         }
     except Exception as e:
-        print(f"Error getting email message details: {e}")
+        logger.error("Error getting email message details: %s", e)
         return None
 
 
@@ -127,10 +137,10 @@ def send_email(service, to, subject, body, body_type="plain", attachment_paths=N
 
     try:
         sent_message = service.users().messages().send(userId="me", body=send_message).execute()
-        print(f"Email sent successfully to {to} with attachments.")
+        logger.info("Email sent successfully to %s with attachments.", to)
         return sent_message
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error("An error occurred: %s", e)
         return None
 
 
@@ -143,7 +153,7 @@ def download_attachments_parent(service, user_id, msg_id, target_dir):
             data = att["data"]
             file_data = base64.urlsafe_b64decode(data.encode("UTF-8"))
             file_path = os.path.join(target_dir, part["filename"])
-            print("Saving attachment to:", file_path)
+            logger.info("Saving attachment to: %s", file_path, extra={"sample": True})
             with open(file_path, "wb") as f:
                 f.write(file_data)
 
@@ -164,7 +174,7 @@ def download_attachments_all(service, user_id, msg_id, target_dir):
                 data = att["data"]
                 file_data = base64.urlsafe_b64decode(data.encode("UTF-8"))
                 file_path = os.path.join(target_dir, part["filename"])
-                print("Saving attachment to:", file_path)
+                logger.info("Saving attachment to: %s", file_path, extra={"sample": True})
                 with open(file_path, "wb") as f:
                     f.write(file_data)
 
@@ -196,6 +206,23 @@ def search_emails(service, query, user_id="me", max_results=5):
     return messages[:max_results] if max_results else messages
 
 
+def search_email_pages(service, query, user_id="me", page_token=None, page_size=500):
+    while True:
+        result = (
+            service.users()
+            .messages()
+            .list(userId=user_id, q=query, maxResults=page_size, pageToken=page_token)
+            .execute()
+        )
+
+        page_token = result.get("nextPageToken")
+
+        yield result.get("messages", []), page_token
+
+        if not page_token:
+            break
+
+
 def search_email_conversations(service, query, user_id="me", max_results=5):
     conversations = []
     next_page_token = None
@@ -1,8 +1,11 @@
+import asyncio
 import logging
 import os
 from pathlib import Path
 from typing import Any
 
+from compaction import DEFAULT_FIELDS, compact_emails
+from export_mailbox import export_mailbox
 from gmail_api import (
     download_attachments_all,
     download_attachments_parent,
@@ -13,16 +16,14 @@ from gmail_api import (
     search_emails,
     send_email,
 )
+from google_apis import get_transport_stats
 from mcp.server.fastmcp import FastMCP
 
+from logging_config import setup_logging
 from tmcp import TmcpManager
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("gmail_mcp.log"), logging.StreamHandler()],
-)
+setup_logging()
 logger = logging.getLogger("gmail_mcp")
 
 # Initialize MCP Server
@@ -35,8 +36,11 @@ mcp = FastMCP(
 )
 
 # Gmail Service Initialization
-client_config = tmcp.retrieve_from_wallet("gmail")
-service = init_gmail_service(client_config)
+# The mailbox export's fork server re-imports this module as __mp_main__; only
+# the server process itself should read the wallet and log in
+if __name__ != "__mp_main__":
+    client_config = tmcp.retrieve_from_wallet("gmail")
+    service = init_gmail_service(client_config)
 
 
 def get_gmail_service(email_identifier: str):
@@ -46,16 +50,24 @@ def get_gmail_service(email_identifier: str):
             raise ValueError(f"Failed to initialize Gmail service for {email_identifier}")
         return service
     except Exception as e:
-        logger.error(f"Error initializing Gmail service: {str(e)}")
+        logger.error("Error initializing Gmail service: %s", e)
         raise
 
 
+def _iter_email_details(service, msg_ids):
+    for msg_id in msg_ids:
+        details = get_email_message_details(service, msg_id)
+        if details:
+            details["id"] = msg_id
+            yield details
+
+
 # Resources
 @mcp.resource("gmail://inbox/{email_identifier}")
 async def get_inbox(email_identifier: str) -> dict[str, Any]:
     """Get latest emails from inbox"""
     try:
-        logger.info(f"Fetching inbox for {email_identifier}")
+        logger.info("Fetching inbox for %s", email_identifier)
         service = get_gmail_service(email_identifier)
         messages, next_page = get_email_messages(service, max_results=10)
         emails = []
@@ -65,7 +77,7 @@ async def get_inbox(email_identifier: str) -> dict[str, Any]:
                 emails.append(details)
         return {"success": True, "emails": emails, "has_more": bool(next_page)}
     except Exception as e:
-        logger.error(f"Error fetching inbox: {str(e)}")
+        logger.error("Error fetching inbox: %s", e)
         return {"success": False, "message": str(e)}
 
 
@@ -73,14 +85,14 @@ async def get_inbox(email_identifier: str) -> dict[str, Any]:
 async def get_email_details(email_identifier: str, msg_id: str) -> dict[str, Any]:
     """Get detailed information about a specific email"""
     try:
-        logger.info(f"Fetching email details for ID {msg_id}")
+        logger.info("Fetching email details for ID %s", msg_id)
         service = get_gmail_service(email_identifier)
         details = get_email_message_details(service, msg_id)
         if details:
             return {"success": True, "email": details}
         return {"success": False, "message": "Email not found"}
     except Exception as e:
-        logger.error(f"Error fetching email details: {str(e)}")
+        logger.error("Error fetching email details: %s", e)
         return {"success": False, "message": str(e)}
 
 
@@ -88,17 +100,23 @@ async def get_email_details(email_identifier: str, msg_id: str) -> dict[str, Any
 async def list_attachments(email_identifier: str, msg_id: str) -> dict[str, Any]:
     """List attachments for a specific email"""
     try:
-        logger.info(f"Listing attachments for email {msg_id}")
+        logger.info("Listing attachments for email %s", msg_id)
         service = get_gmail_service(email_identifier)
         details = get_email_message_details(service, msg_id)
         if details and details.get("has_attachments"):
             return {"success": True, "has_attachments": True, "message_id": msg_id}
         return {"success": True, "has_attachments": False}
     except Exception as e:
-        logger.error(f"Error listing attachments: {str(e)}")
+        logger.error("Error listing attachments: %s", e)
         return {"success": False, "message": str(e)}
 
 
+@mcp.resource("gmail://transport/stats")
+async def transport_stats() -> dict[str, Any]:
+    """Bytes received on the wire vs. decoded across all Gmail API calls"""
+    return {"success": True, "stats": get_transport_stats()}
+
+
 # Tools
 @mcp.tool()
 async def send_gmail(
@@ -106,7 +124,7 @@ async def send_gmail(
 ) -> dict[str, Any]:
     """Send an email with optional attachments"""
     try:
-        logger.info(f"Sending email to {to} from {email_identifier}")
+        logger.info("Sending email to %s from %s", to, email_identifier)
         service = get_gmail_service(email_identifier)
 
         # Validate attachment paths
@@ -127,74 +145,101 @@ async def send_gmail(
             }
         return {"success": False, "message": "Failed to send email"}
     except Exception as e:
-        logger.error(f"Error sending email: {str(e)}")
+        logger.error("Error sending email: %s", e)
         return {"success": False, "message": str(e)}
 
 
 @mcp.tool()
 async def search_email_tool(
-    email_identifier: str, query: str = "", max_results: int = 30, include_conversations: bool = True
+    email_identifier: str,
+    query: str = "",
+    max_results: int = 30,
+    include_conversations: bool = True,
+    compact: bool = True,
+    fields: list[str] | None = None,
+    max_body_tokens: int = 500,
+    max_response_tokens: int = 8000,
 ) -> dict[str, Any]:
-    """Search emails with optional conversation inclusion"""
+    """Search emails with optional conversation inclusion.
+
+    With compact=True, quoted history and signatures are stripped, only the
+    requested fields are returned, and bodies and the whole response are kept
+    within the given token budgets.
+    """
     try:
-        logger.info(f"Searching emails for {email_identifier} with query: {query}")
+        logger.info("Searching emails for %s with query: %s", email_identifier, query)
         service = get_gmail_service(email_identifier)
 
-        emails = []
         # Search regular emails
-        messages = search_emails(service, query, max_results=max_results)
-        for msg in messages:
-            details = get_email_message_details(service, msg["id"])
-            if details:
-                emails.append(details)
+        msg_ids = [msg["id"] for msg in search_emails(service, query, max_results=max_results)]
 
         # Search conversations if requested
         if include_conversations:
             conversations = search_email_conversations(service, query, max_results=max_results)
-            for conv in conversations:
-                details = get_email_message_details(service, conv["id"])
-                if details:
-                    emails.append(details)
+            msg_ids.extend(conv["id"] for conv in conversations)
 
-        return {"success": True, "message": f"Found {len(emails)} emails", "emails": emails}
+        details = _iter_email_details(service, msg_ids)
+        if not compact:
+            emails = list(details)
+            return {"success": True, "message": f"Found {len(emails)} emails", "emails": emails}
+
+        # Details are fetched lazily, so messages past the budget are never requested
+        emails, truncated = compact_emails(details, fields or DEFAULT_FIELDS, max_body_tokens, max_response_tokens)
+        return {
+            "success": True,
+            "message": f"Found {len(emails)} emails" + (" (response budget reached)" if truncated else ""),
+            "emails": emails,
+            "truncated": truncated,
+        }
     except Exception as e:
-        logger.error(f"Error searching emails: {str(e)}")
+        logger.error("Error searching emails: %s", e)
         return {"success": False, "message": str(e), "emails": []}
 
 
 @mcp.tool()
 async def read_latest_emails(
-    email_identifier: str, max_results: int = 5, download_attachments: bool = False
+    email_identifier: str,
+    max_results: int = 5,
+    download_attachments: bool = False,
+    compact: bool = True,
+    fields: list[str] | None = None,
+    max_body_tokens: int = 500,
+    max_response_tokens: int = 8000,
 ) -> dict[str, Any]:
-    """Read latest emails with optional attachment download"""
+    """Read latest emails with optional attachment download and compaction (see search_email_tool)"""
     try:
-        logger.info(f"Reading latest {max_results} emails for {email_identifier}")
+        logger.info("Reading latest %s emails for %s", max_results, email_identifier)
         service = get_gmail_service(email_identifier)
 
         messages, _ = get_email_messages(service, max_results=max_results)
-        emails = []
 
         attachment_dir = Path("./downloaded_attachments")
         if download_attachments:
             attachment_dir.mkdir(exist_ok=True)
 
-        for msg in messages:
-            details = get_email_message_details(service, msg["id"])
-            if details:
-                if download_attachments and details.get("has_attachments"):
-                    download_attachments_parent(service, user_id="me", msg_id=msg["id"], target_dir=str(attachment_dir))
-                    details["attachments_downloaded"] = True
-                    details["attachment_dir"] = str(attachment_dir)
-                emails.append(details)
+        details = list(_iter_email_details(service, [msg["id"] for msg in messages]))
+        emails = details
+
+        truncated = False
+        if compact:
+            emails, truncated = compact_emails(details, fields or DEFAULT_FIELDS, max_body_tokens, max_response_tokens)
+
+        # Apply the response budget first so attachments are only saved for messages that are returned
+        for full, email in zip(details, emails):
+            if download_attachments and full.get("has_attachments"):
+                download_attachments_parent(service, user_id="me", msg_id=full["id"], target_dir=str(attachment_dir))
+                email["attachments_downloaded"] = True
+                email["attachment_dir"] = str(attachment_dir)
 
         return {
             "success": True,
             "message": f"Retrieved {len(emails)} latest emails",
             "emails": emails,
             "attachment_downloads": download_attachments,
+            "truncated": truncated,
         }
     except Exception as e:
-        logger.error(f"Error reading latest emails: {str(e)}")
+        logger.error("Error reading latest emails: %s", e)
         return {"success": False, "message": str(e), "emails": []}
 
 
@@ -204,7 +249,7 @@ async def download_email_attachments(
 ) -> dict[str, Any]:
     """Download attachments for a specific email or its entire thread"""
     try:
-        logger.info(f"Downloading attachments for email {msg_id}")
+        logger.info("Downloading attachments for email %s", msg_id)
         service = get_gmail_service(email_identifier)
 
         attachment_dir = Path("./downloaded_attachments")
@@ -222,7 +267,46 @@ async def download_email_attachments(
             "thread_downloaded": download_all_in_thread,
         }
     except Exception as e:
-        logger.error(f"Error downloading attachments: {str(e)}")
+        logger.error("Error downloading attachments: %s", e)
+        return {"success": False, "message": str(e)}
+
+
+@mcp.tool()
+async def export_mailbox_tool(
+    email_identifier: str,
+    output_path: str,
+    query: str = "",
+    export_format: str = "mbox",
+    compression: str = "gzip",
+    resume: bool = True,
+    overwrite: bool = False,
+) -> dict[str, Any]:
+    """Export matching emails to a compressed mbox or JSONL file, resuming from its checkpoint.
+
+    An existing file at output_path is only replaced when overwrite is true.
+    """
+    try:
+        logger.info("Exporting emails for %s with query: %s to %s", email_identifier, query, output_path)
+        service = get_gmail_service(email_identifier)
+
+        # Large exports run for a long time, keep them off the event loop
+        summary = await asyncio.to_thread(
+            export_mailbox,
+            service,
+            output_path,
+            query=query,
+            export_format=export_format,
+            compression=compression,
+            resume=resume,
+            overwrite=overwrite,
+        )
+
+        message = f"Exported {summary['exported']} emails to {output_path}"
+        if summary["skipped"]:
+            message += f"; {summary['skipped']} could not be fetched, run the export again to retry them"
+        return {"success": True, "message": message, **summary}
+    except Exception as e:
+        logger.error("Error exporting mailbox: %s", e)
         return {"success": False, "message": str(e)}
 
 
@@ -351,4 +435,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Server shutting down gracefully...")
     except Exception as e:
-        logger.error(f"Fatal server error: {str(e)}")
+        logger.error("Fatal server error: %s", e)
@@ -1,19 +1,183 @@
 # google_apis.py
 import os
+import gzip
 import json
+import logging
+import threading
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
 
-from google.auth.transport.requests import Request
+import httplib2
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from requests.adapters import HTTPAdapter
 
+logger = logging.getLogger("google_apis")
 
-def create_service(client_secret_data, api_name, api_version, *scopes, prefix=""):
+
+@dataclass(frozen=True)
+class TransportConfig:
+    gzip: bool = True
+    user_agent: str = "gmail-mcp-server/0.1.0"
+    pool_connections: int = 10
+    pool_maxsize: int = 10
+    connect_timeout: float = 10.0
+    read_timeout: float = 60.0
+    proxy: str | None = None
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            gzip=env.get("GMAIL_MCP_HTTP_GZIP", "1").lower() not in ("0", "false", "no"),
+            pool_connections=_env_number("GMAIL_MCP_HTTP_POOL_CONNECTIONS", int, cls.pool_connections),
+            pool_maxsize=_env_number("GMAIL_MCP_HTTP_POOL_MAXSIZE", int, cls.pool_maxsize),
+            connect_timeout=_env_number("GMAIL_MCP_HTTP_CONNECT_TIMEOUT", float, cls.connect_timeout),
+            read_timeout=_env_number("GMAIL_MCP_HTTP_READ_TIMEOUT", float, cls.read_timeout),
+            proxy=env.get("GMAIL_MCP_HTTP_PROXY") or None,
+        )
+
+
+def _env_number(name, cast, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+
+
+class TransportStats:
+    """Running totals of response body bytes received vs. bytes after decoding."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+
+    def record(self, wire_bytes, decoded_bytes):
+        with self._lock:
+            self.requests += 1
+            self.wire_bytes += wire_bytes
+            self.decoded_bytes += decoded_bytes
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "wire_bytes": self.wire_bytes,
+                "decoded_bytes": self.decoded_bytes,
+                "saved_bytes": self.decoded_bytes - self.wire_bytes,
+                "compression_ratio": round(self.decoded_bytes / self.wire_bytes, 2) if self.wire_bytes else None,
+            }
+
+
+transport_stats = TransportStats()
+
+
+def get_transport_stats():
+    return transport_stats.snapshot()
+
+
+@lru_cache(maxsize=None)
+def _shared_adapter(pool_connections, pool_maxsize):
+    # One adapter per pool shape, so every service built in this process reuses
+    # the same keep-alive connections instead of opening its own.
+    return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+
+class AuthorizedTransport:
+    """httplib2-compatible ``request()`` backed by a pooled ``requests`` session.
+
+    ``googleapiclient`` only needs ``request()`` to return an ``httplib2.Response``
+    and the decoded body, which lets us control pooling, timeouts, proxies and
+    compression while the session keeps handling credential refresh.
+    """
+
+    def __init__(self, credentials, config=None, stats=transport_stats):
+        self.config = config or TransportConfig.from_env()
+        self.stats = stats
+        self.session = AuthorizedSession(credentials)
+
+        adapter = _shared_adapter(self.config.pool_connections, self.config.pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Google only serves gzip when the User-Agent also contains "gzip"
+        if self.config.gzip:
+            self.headers = {"accept-encoding": "gzip", "user-agent": f"{self.config.user_agent} (gzip)"}
+        else:
+            self.headers = {"accept-encoding": "identity", "user-agent": self.config.user_agent}
+
+        if self.config.proxy:
+            self.session.proxies = {"http": self.config.proxy, "https": self.config.proxy}
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        # googleapiclient sets its own accept-encoding and user-agent on every call,
+        # and per-request headers win over session ones, so replace them here
+        headers = {name: value for name, value in (headers or {}).items() if name.lower() not in self.headers}
+        headers.update(self.headers)
+        response = self.session.request(
+            method,
+            uri,
+            data=body,
+            headers=headers,
+            timeout=(self.config.connect_timeout, self.config.read_timeout),
+            allow_redirects=redirections > 0,
+            stream=True,
+        )
+        # Read the body undecoded so wire bytes are counted for chunked responses
+        # too (urllib3's tell() only tracks read(), not read_chunked())
+        raw = b"".join(response.raw.stream(64 * 1024, decode_content=False))
+        response.raw.release_conn()
+
+        info = {name.lower(): value for name, value in response.headers.items()}
+        encoding = info.get("content-encoding", "").strip().lower()
+        content = _decode_body(raw, encoding)
+        self.stats.record(len(raw), len(content))
+
+        # Same bookkeeping httplib2 does after transparently decompressing
+        if encoding in ("gzip", "deflate"):
+            info["-content-encoding"] = info.pop("content-encoding")
+            info["content-length"] = str(len(content))
+        info["status"] = str(response.status_code)
+
+        resp = httplib2.Response(info)
+        resp.reason = response.reason
+        return resp, content
+
+    def close(self):
+        # The pooled adapter is shared with other services, so leave it open
+        pass
+
+
+def _decode_body(raw, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(raw)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(raw)
+        except zlib.error:
+            # Some servers send raw deflate without the zlib wrapper
+            return zlib.decompress(raw, -zlib.MAX_WBITS)
+    return raw
+
+
+def create_service(client_secret_data, api_name, api_version, *scopes, prefix="", transport_config=None):
     API_SERVICE_NAME = api_name
     API_VERSION = api_version
 
     SCOPES = list(scopes[0])
 
+    # Resolve the transport settings up front so a bad GMAIL_MCP_HTTP_* value
+    # fails here instead of being mistaken for a corrupted token below
+    transport_config = transport_config or TransportConfig.from_env()
+
     creds = None
     working_dir = os.getcwd()
     token_dir = "token_files"
@@ -41,13 +205,14 @@ def create_service(client_secret_data, api_name, api_version, *scopes, prefix=""
         with open(os.path.join(working_dir, token_dir, token_file), "w") as token:
             token.write(creds.to_json())
 
+    http = AuthorizedTransport(creds, transport_config)
+
     try:
-        service = build(API_SERVICE_NAME, API_VERSION, credentials=creds, static_discovery=False)
-        print(f"{API_SERVICE_NAME} {API_VERSION} service created successfully for {prefix}")
+        service = build(API_SERVICE_NAME, API_VERSION, http=http, static_discovery=False)
+        logger.info("%s %s service created successfully for %s", API_SERVICE_NAME, API_VERSION, prefix)
         return service
     except Exception as e:
-        print(e)
-        print(f"Failed to create service instance for {API_SERVICE_NAME}")
+        logger.error("Failed to create service instance for %s: %s", API_SERVICE_NAME, e)
         # Remove corrupted token file if exists
         if os.path.exists(os.path.join(working_dir, token_dir, token_file)):
             os.remove(os.path.join(working_dir, token_dir, token_file))
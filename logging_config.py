@@ -0,0 +1,111 @@
+# logging_config.py
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+# Attributes every LogRecord carries; anything else was passed through ``extra=``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render each record as a single JSON object, including ``extra=`` fields."""
+
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != "sample":
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records logged with ``extra={"sample": True}``."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if not getattr(record, "sample", False) or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock handler merges ``msg % args`` in the calling thread. The queue is
+    # in-process, so hand the record over untouched and let the listener thread
+    # do all of the formatting.
+    def prepare(self, record):
+        return record
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level=None, log_file=None, logger_levels=None, sample_rate=None):
+    """Route all logging through a background queue listener.
+
+    Handlers that touch the disk or the console run on the listener thread, so
+    a log call inside a request handler only costs a queue put. Arguments fall
+    back to the ``GMAIL_MCP_LOG_*`` environment variables.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if level is None:
+        level = os.environ.get("GMAIL_MCP_LOG_LEVEL", "INFO")
+    if log_file is None:
+        log_file = os.environ.get("GMAIL_MCP_LOG_FILE", "gmail_mcp.log")
+    if logger_levels is None:
+        logger_levels = _parse_levels(os.environ.get("GMAIL_MCP_LOG_LEVELS", ""))
+    if sample_rate is None:
+        sample_rate = float(os.environ.get("GMAIL_MCP_LOG_SAMPLE_RATE", "1.0"))
+
+    formatter = JsonFormatter()
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = _DeferredQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    root.handlers[:] = [queue_handler]
+    for name, logger_level in logger_levels.items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None